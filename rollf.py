@@ -6,11 +6,12 @@
 # Source: https://github.com/hegernat/rollf-bot
 # -----------------------------------------
 
-import threading
 import aiohttp
+import threading
 import asyncio
+import atexit
 import sqlite3
-import secrets
+import random
 import time
 import csv
 import io
@@ -18,6 +19,8 @@ import os
 import discord
 import logging
 from logging.handlers import TimedRotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
 from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
@@ -32,6 +35,10 @@ TZ = ZoneInfo("Europe/Stockholm")
 BOT_NAME = "#RollF"
 DB_PATH = "bot.db"
 
+# One shared CSPRNG for stored rolls and the bot's roll time. The /roll
+# animation is cosmetic and draws from the plain random module
+_RNG = random.SystemRandom()
+
 BOTLIST_COMMANDS = [
     {"command": "roll", "description": "Roll your daily number (1–100)"},
     {"command": "leaderboards", "description": "View rankings for different periods"},
@@ -48,6 +55,7 @@ ENABLE_COMMAND_LOGGING = (
 )
 LOG_RETENTION_DAYS = 30
 DAILY_ROLL_TASK = None
+LEADERBOARD_TASK = None
 
 # ---------------- ADMIN ----------------
 
@@ -115,226 +123,554 @@ async def post_botlist_commands():
                 "BOTLIST COMMAND UPDATE FAILED"
             )
 
-def ensure_schema():
-
-    with db() as con:
+def ensure_schema(con):
+
+    # Only the columns the bot reads and writes, existing databases keep
+    # whatever they were created with
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS rolls (
+        id INTEGER PRIMARY KEY,
+        user_id INTEGER NOT NULL,
+        username TEXT,
+        value INTEGER NOT NULL,
+        rolled_at INTEGER NOT NULL,
+        actor_type TEXT NOT NULL,
+        roll_date TEXT
+    )
+    """)
 
-        cols = con.execute("PRAGMA table_info(rolls)").fetchall()
-        names = {c[1] for c in cols}
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS users (
+        user_id INTEGER PRIMARY KEY,
+        username TEXT,
+        updated_at INTEGER
+    )
+    """)
+
+    cols = con.execute("PRAGMA table_info(rolls)").fetchall()
+    names = {c[1] for c in cols}
+
+    if "roll_date" not in names:
+        con.execute("ALTER TABLE rolls ADD COLUMN roll_date TEXT")
+
+    con.execute("""
+    UPDATE rolls
+    SET roll_date = date(rolled_at, 'unixepoch')
+    WHERE roll_date IS NULL
+    """)
+
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS daily_scores (
+        user_id INTEGER,
+        roll_date TEXT,
+        score INTEGER NOT NULL,
+        rolls INTEGER NOT NULL,
+        PRIMARY KEY(user_id, roll_date)
+    )
+    """)
 
-        if "roll_date" not in names:
-            con.execute("ALTER TABLE rolls ADD COLUMN roll_date TEXT")
+    count = con.execute(
+        "SELECT COUNT(*) FROM daily_scores"
+    ).fetchone()[0]
 
+    if count == 0:
         con.execute("""
-        UPDATE rolls
-        SET roll_date = date(rolled_at, 'unixepoch')
-        WHERE roll_date IS NULL
+        INSERT INTO daily_scores (user_id, roll_date, score, rolls)
+        SELECT
+            user_id,
+            roll_date,
+            SUM(value),
+            COUNT(*)
+        FROM rolls
+        WHERE actor_type = 'user'
+          AND roll_date IS NOT NULL
+        GROUP BY user_id, roll_date
         """)
 
+    con.execute("""
+    CREATE TABLE IF NOT EXISTS user_scores (
+        user_id INTEGER PRIMARY KEY,
+        score INTEGER NOT NULL DEFAULT 0,
+        rolls INTEGER NOT NULL DEFAULT 0,
+        best INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+    count = con.execute("SELECT COUNT(*) FROM user_scores").fetchone()[0]
+
+    if count == 0:
         con.execute("""
-        CREATE TABLE IF NOT EXISTS daily_scores (
-            user_id INTEGER,
-            roll_date TEXT,
-            score INTEGER NOT NULL,
-            rolls INTEGER NOT NULL,
-            PRIMARY KEY(user_id, roll_date)
-        )
+        INSERT INTO user_scores (user_id, score, rolls, best)
+        SELECT
+            user_id,
+            SUM(value),
+            COUNT(*),
+            MAX(value)
+        FROM rolls
+        WHERE actor_type = 'user'
+        GROUP BY user_id
         """)
 
-        count = con.execute(
-            "SELECT COUNT(*) FROM daily_scores"
-        ).fetchone()[0]
-
-        if count == 0:
-            con.execute("""
-            INSERT INTO daily_scores (user_id, roll_date, score, rolls)
-            SELECT
-                user_id,
-                roll_date,
-                SUM(value),
-                COUNT(*)
-            FROM rolls
-            WHERE actor_type = 'user'
-              AND roll_date IS NOT NULL
-            GROUP BY user_id, roll_date
-            """)
-
-_local = threading.local()
+        print("Backfilled user_scores from rolls table")
 
-def db():
-    con = getattr(_local, "con", None)
+    ensure_guild_tables(con)
 
-    if con is None:
-        con = sqlite3.connect(
-            DB_PATH,
-            timeout=30,
-            isolation_level=None
+# Migration copies rows in this order, so the row to keep is inserted
+# last and wins the INSERT OR REPLACE when a guild has duplicates
+GUILD_TABLES = {
+    "guild_channels": (
+        """
+        CREATE TABLE {name} (
+            guild_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL,
+            set_at INTEGER
         )
-        con.row_factory = sqlite3.Row
-        con.execute("PRAGMA journal_mode=WAL")
-        con.execute("PRAGMA synchronous=NORMAL")
-        con.execute("PRAGMA temp_store=MEMORY")
-        con.execute("PRAGMA foreign_keys=ON")
-        _local.con = con
-
-    return con
+        """,
+        "set_at, rowid"
+    ),
+    "guild_meta": (
+        """
+        CREATE TABLE {name} (
+            guild_id INTEGER PRIMARY KEY,
+            onboarding_sent INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "onboarding_sent, rowid"
+    ),
+}
+
+def ensure_guild_tables(con):
+    """
+    Both guild tables are upserted ON CONFLICT(guild_id), so guild_id has
+    to be the primary key. Older databases created them without one,
+    those are rebuilt once with a single row per guild. Columns the old
+    table has beyond the ones above are carried over as they are.
+    """
+    for name, (create_sql, keep_order) in GUILD_TABLES.items():
+        cols = con.execute(f"PRAGMA table_info({name})").fetchall()
+
+        if not cols:
+            con.execute(create_sql.format(name=name))
+            continue
 
-def ensure_indexes():
-    with db() as con:
+        if any(c[1] == "guild_id" and c[5] == 1 for c in cols):
+            continue
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_guild_channels_guild
-        ON guild_channels(guild_id)
-        """)
+        with write_transaction(con):
+            con.execute(create_sql.format(name=f"{name}_new"))
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_guild_channels_channel
-        ON guild_channels(channel_id)
-        """)
+            known = {
+                c[1] for c in con.execute(f"PRAGMA table_info({name}_new)")
+            }
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_rolls_actor_date
-        ON rolls(actor_type, roll_date)
-        """)
+            for _, col, col_type, _, default, _ in cols:
+                if col not in known:
+                    extra = f" DEFAULT {default}" if default is not None else ""
+                    con.execute(
+                        f'ALTER TABLE {name}_new ADD COLUMN "{col}" {col_type}{extra}'
+                    )
 
-        con.execute("""
-        CREATE UNIQUE INDEX IF NOT EXISTS idx_one_roll_per_day
-        ON rolls(user_id, roll_date)
-        WHERE actor_type='user'
-        """)
+            columns = ", ".join(f'"{c[1]}"' for c in cols)
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_daily_scores_date
-        ON daily_scores(roll_date)
-        """)
+            con.execute(f"""
+            INSERT OR REPLACE INTO {name}_new ({columns})
+            SELECT {columns} FROM {name}
+            WHERE guild_id IS NOT NULL
+            ORDER BY {keep_order}
+            """)
+            con.execute(f"DROP TABLE {name}")
+            con.execute(f"ALTER TABLE {name}_new RENAME TO {name}")
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_rolls_actor_time_user
-        ON rolls(actor_type, rolled_at, user_id)
-        """)
+        print(f"Rebuilt {name} with guild_id as primary key")
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_user_scores_score
-        ON user_scores(score DESC)
-        """)
+READ_POOL_SIZE = 4
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_rolls_user_time
-        ON rolls(user_id, rolled_at)
-        """)
+def open_connection(query_only=False):
+    con = sqlite3.connect(
+        DB_PATH,
+        timeout=30,
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=256
+    )
+    con.row_factory = sqlite3.Row
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA temp_store=MEMORY")
+    con.execute("PRAGMA cache_size=-64000")
+    con.execute("PRAGMA mmap_size=268435456")
+    con.execute("PRAGMA foreign_keys=ON")
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_rolls_time
-        ON rolls(rolled_at)
-        """)
+    if query_only:
+        con.execute("PRAGMA query_only=1")
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_rolls_user_period
-        ON rolls(rolled_at, user_id)
-        WHERE actor_type='user'
-        """)
+    return con
 
-        con.execute("""
-        CREATE INDEX IF NOT EXISTS idx_rolls_user_date
-        ON rolls(user_id, roll_date)
-        WHERE actor_type='user'
-        """)
+# Held by every statement sequence on the writer, from pooled writes in
+# worker threads as well as the synchronous startup and shutdown paths
+WRITE_LOCK = threading.Lock()
+
+@contextmanager
+def write_transaction(con):
+    """
+    Explicit transaction on the writer, committed on success and rolled
+    back on any exception. IMMEDIATE takes the write lock up front so a
+    busy database fails at BEGIN instead of halfway through. A failed
+    COMMIT can leave the transaction open, that is rolled back too so
+    the shared writer can start the next one.
+    """
+    con.execute("BEGIN IMMEDIATE")
 
-        con.execute("""
-        CREATE TABLE IF NOT EXISTS user_scores (
-            user_id INTEGER PRIMARY KEY,
-            score INTEGER NOT NULL DEFAULT 0,
-            rolls INTEGER NOT NULL DEFAULT 0,
-            best INTEGER NOT NULL DEFAULT 0
+    try:
+        yield con
+        con.execute("COMMIT")
+    except BaseException:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        raise
+
+class SqlitePool:
+    """
+    Fixed set of read-only connections plus the single writer.
+    WAL lets readers run in parallel with each other and with the writer,
+    so each acquired connection is used from a worker thread. The pool
+    has its own executor, one thread per connection, so queries never
+    wait behind other to_thread work in the loop's default executor.
+    """
+
+    def __init__(self, writer, size):
+        self.writer = writer
+        self.write_lock = asyncio.Lock()
+        self.readers = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(
+            max_workers=size + 1,
+            thread_name_prefix="sqlite"
         )
-        """)
 
-        count = con.execute("SELECT COUNT(*) FROM user_scores").fetchone()[0]
+        for _ in range(size):
+            self.readers.put_nowait(open_connection(query_only=True))
 
-        if count == 0:
-            con.execute("""
-            INSERT INTO user_scores (user_id, score, rolls, best)
-            SELECT
-                user_id,
-                SUM(value),
-                COUNT(*),
-                MAX(value)
-            FROM rolls
-            WHERE actor_type = 'user'
-            GROUP BY user_id
-            """)
+    @asynccontextmanager
+    async def acquire_write(self):
+        async with self.write_lock:
+            yield self.writer
 
-            print("Backfilled user_scores from rolls table")
+    async def read(self, fn, *args):
+        con = await self.readers.get()
+        future = self._run(fn, con, *args)
+
+        # The connection goes back once the worker thread is done with it,
+        # not when the awaiting task is cancelled while the query still runs
+        def release(done):
+            if not done.cancelled():
+                done.exception()
+            self.readers.put_nowait(con)
+
+        future.add_done_callback(release)
+
+        return await asyncio.shield(future)
+
+    async def write(self, fn, *args):
+        async with self.acquire_write() as con:
+            return await self._run(self._locked_write, fn, con, *args)
+
+    def _run(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    @staticmethod
+    def _locked_write(fn, con, *args):
+        with WRITE_LOCK:
+            return fn(con, *args)
+
+def optimize_db(con):
+    # 0x10000 checks every table, not only the ones this connection has
+    # queried, since the reads run on the pooled connections
+    con.execute("PRAGMA optimize=0x10002")
+
+CONN = open_connection()
+POOL = SqlitePool(CONN, READ_POOL_SIZE)
+
+def close_db():
+    with WRITE_LOCK:
+        optimize_db(CONN)
+
+atexit.register(close_db)
+
+def prepare_database(con):
+    ensure_schema(con)
+    ensure_indexes(con)
+
+def ensure_indexes(con):
+
+    # guild_id is the primary key now
+    con.execute("DROP INDEX IF EXISTS idx_guild_channels_guild")
+
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_guild_channels_channel
+    ON guild_channels(channel_id)
+    """)
+
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_rolls_actor_date
+    ON rolls(actor_type, roll_date)
+    """)
+
+    con.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_one_roll_per_day
+    ON rolls(user_id, roll_date)
+    WHERE actor_type='user'
+    """)
+
+    # The period leaderboard skip-scans the (user_id, roll_date) primary
+    # key, which hands rows to GROUP BY user_id already in order. The
+    # planner picks that over either roll_date index, so they only cost
+    # every roll an extra write
+    con.execute("DROP INDEX IF EXISTS idx_daily_scores_date")
+    con.execute("DROP INDEX IF EXISTS idx_daily_scores_date_cover")
+
+    con.execute("DROP INDEX IF EXISTS idx_rolls_actor_time_user")
+
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_rolls_actor_time_val
+    ON rolls(actor_type, rolled_at, user_id, value)
+    """)
+
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_user_scores_score
+    ON user_scores(score DESC)
+    """)
+
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_rolls_user_time
+    ON rolls(user_id, rolled_at)
+    """)
+
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_rolls_time
+    ON rolls(rolled_at)
+    """)
+
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_rolls_user_actor_time
+    ON rolls(user_id, actor_type, rolled_at DESC, value)
+    """)
+
+    con.execute("""
+    CREATE INDEX IF NOT EXISTS idx_rolls_user_period
+    ON rolls(rolled_at, user_id)
+    WHERE actor_type='user'
+    """)
+
+    # Same columns and filter as idx_one_roll_per_day, which already
+    # serves every lookup it could
+    con.execute("DROP INDEX IF EXISTS idx_rolls_user_date")
+
+    # Without statistics the planner guesses between the overlapping rolls
+    # indexes. optimize_db keeps them current once they exist
+    has_stats = con.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).fetchone()
+
+    if not has_stats:
+        con.execute("ANALYZE")
+
+def now_s() -> int:
+    """Current epoch second, without going through a float."""
+    return time.time_ns() // 1_000_000_000
+
+_TODAY_CACHE = None
+
+def _today():
+    """
+    (start, end, date, week, month) for the local day, week and month as
+    (start, end) epoch pairs. Within the cached day this is one now_s()
+    call, the zoneinfo math only runs once the day has turned.
+    """
+    global _TODAY_CACHE
+
+    if _TODAY_CACHE is not None and _TODAY_CACHE[0] <= now_s() < _TODAY_CACHE[1]:
+        return _TODAY_CACHE
 
-def today_range():
     now = datetime.now(TZ)
     start = datetime(now.year, now.month, now.day, tzinfo=TZ)
     end = start + timedelta(days=1)
-    return int(start.timestamp()), int(end.timestamp())
 
-def bot_rolled_today():
-    start, end = today_range()
-    with db() as con:
-        cur = con.execute(
-            """SELECT 1 FROM rolls
-               WHERE actor_type='bot'
-               AND rolled_at BETWEEN ? AND ?
-               LIMIT 1""",
-            (start, end)
-        )
-        return cur.fetchone() is not None
-        
-def upsert_user(user_id: int, username: str):
-    now = int(time.time())
-    with db() as con:
-        con.execute(
-            """
-            INSERT INTO users (user_id, username, updated_at)
-            VALUES (?, ?, ?)
-            ON CONFLICT(user_id)
-            DO UPDATE SET
-                username = excluded.username,
-                updated_at = excluded.updated_at
-            """,
-            (user_id, username, now)
-        )
+    week_start = start - timedelta(days=start.weekday())
+    week_start = datetime(week_start.year, week_start.month, week_start.day, tzinfo=TZ)
+    week_end = week_start + timedelta(days=7)
+
+    month_start = datetime(now.year, now.month, 1, tzinfo=TZ)
+    if now.month == 12:
+        month_end = datetime(now.year + 1, 1, 1, tzinfo=TZ)
+    else:
+        month_end = datetime(now.year, now.month + 1, 1, tzinfo=TZ)
 
-def insert_roll(user_id, username, value, actor_type):
+    _TODAY_CACHE = (
+        int(start.timestamp()),
+        int(end.timestamp()),
+        start.date().isoformat(),
+        (int(week_start.timestamp()), int(week_end.timestamp())),
+        (int(month_start.timestamp()), int(month_end.timestamp()))
+    )
 
-    ts = int(time.time())
+    return _TODAY_CACHE
+
+def today_range():
+    """Local midnight to the next one as epoch seconds."""
+    start, end = _today()[:2]
+    return start, end
+
+def period_windows():
+    """(week, month) epoch windows containing today."""
+    return _today()[3:]
+
+def today_date():
+    """Local date as stored in rolls.roll_date."""
+    return _today()[2]
+
+# Both probe by roll_date so they are equality lookups on
+# idx_rolls_actor_date and idx_one_roll_per_day, not time ranges
+_SQL_ROLLED_TODAY = """
+    SELECT 1 FROM rolls
+    WHERE actor_type = 'bot'
+      AND roll_date = ?
+    LIMIT 1
+"""
+
+_SQL_TODAY_ROLL = """
+    SELECT value
+    FROM rolls
+    WHERE user_id = ?
+      AND actor_type = 'user'
+      AND roll_date = ?
+"""
+
+# (roll_date, rolled) for the last day checked. Keyed by day so the
+# answer lapses by itself at midnight
+_bot_rolled_cache: tuple[str, bool] | None = None
+
+def bot_rolled_today(con):
+    global _bot_rolled_cache
+
+    day = today_date()
+
+    if _bot_rolled_cache is not None and _bot_rolled_cache[0] == day:
+        return _bot_rolled_cache[1]
+
+    cur = con.execute(_SQL_ROLLED_TODAY, (day,))
+    _bot_rolled_cache = (day, cur.fetchone() is not None)
+    return _bot_rolled_cache[1]
+
+def get_today_roll(con, user_id: int, day: str):
+    return con.execute(_SQL_TODAY_ROLL, (user_id, day)).fetchone()
+
+# Every /roll runs these, kept as constants like the probes above
+_SQL_UPSERT_USER = """
+    INSERT INTO users (user_id, username, updated_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT(user_id)
+    DO UPDATE SET
+        username = excluded.username,
+        updated_at = excluded.updated_at
+"""
+
+_SQL_INSERT_ROLL = """
+    INSERT INTO rolls (user_id, username, value, rolled_at, actor_type, roll_date)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_ADD_USER_SCORE = """
+    INSERT INTO user_scores (user_id, score, rolls, best)
+    VALUES (?, ?, 1, ?)
+    ON CONFLICT(user_id) DO UPDATE SET
+        score = score + excluded.score,
+        rolls = rolls + 1,
+        best = MAX(best, excluded.best)
+"""
+
+_SQL_ADD_DAILY_SCORE = """
+    INSERT INTO daily_scores (user_id, roll_date, score, rolls)
+    VALUES (?, ?, ?, 1)
+    ON CONFLICT(user_id, roll_date) DO UPDATE SET
+        score = score + excluded.score,
+        rolls = rolls + 1
+"""
+
+def upsert_user(con, user_id: int, username: str):
+    con.execute(_SQL_UPSERT_USER, (user_id, username, now_s()))
+
+def insert_roll(con, user_id, username, value, actor_type):
+    global _bot_rolled_cache
+
+    ts = now_s()
     roll_date = datetime.fromtimestamp(ts, TZ).date().isoformat()
 
-    with db() as con:
+    try:
+        con.execute(
+            _SQL_INSERT_ROLL,
+            (user_id, username, value, ts, actor_type, roll_date)
+        )
+    except sqlite3.IntegrityError:
+        return False
 
-        try:
-            con.execute(
-                """INSERT INTO rolls (user_id, username, value, rolled_at, actor_type, roll_date)
-                   VALUES (?, ?, ?, ?, ?, ?)""",
-                (user_id, username, value, ts, actor_type, roll_date)
-            )
-        except sqlite3.IntegrityError:
-            return False
-
-        if actor_type == 'user':
-            con.execute("""
-            INSERT INTO user_scores (user_id, score, rolls, best)
-            VALUES (?, ?, 1, ?)
-            ON CONFLICT(user_id) DO UPDATE SET
-                score = score + excluded.score,
-                rolls = rolls + 1,
-                best = MAX(best, excluded.best)
-            """, (user_id, value, value))
-
-            con.execute("""
-            INSERT INTO daily_scores (user_id, roll_date, score, rolls)
-            VALUES (?, ?, ?, 1)
-            ON CONFLICT(user_id, roll_date) DO UPDATE SET
-                score = score + excluded.score,
-                rolls = rolls + 1
-            """, (user_id, roll_date, value))
+    if actor_type == 'user':
+        con.execute(_SQL_ADD_USER_SCORE, (user_id, value, value))
+        con.execute(_SQL_ADD_DAILY_SCORE, (user_id, roll_date, value))
+    else:
+        _bot_rolled_cache = (roll_date, True)
 
     return True
 
+USERNAME_CACHE: dict[int, str] = {}
+
+def record_roll(con, user_id: int, username: str, value: int):
+    """
+    Store a user roll and refresh the username in one transaction.
+    The users row is only rewritten when the name differs from the last
+    one stored, a rejected duplicate still keeps the fresh name.
+    Returns False if the user already rolled today.
+    """
+    refresh_name = USERNAME_CACHE.get(user_id) != username
+
+    with write_transaction(con):
+        if refresh_name:
+            upsert_user(con, user_id, username)
+        inserted = insert_roll(con, user_id, username, value, "user")
+
+    if refresh_name:
+        USERNAME_CACHE[user_id] = username
+
+    return inserted
+
+def record_bot_roll(con, value: int):
+    """
+    The bot's daily roll. It is a single insert, so it needs no explicit
+    transaction.
+    """
+    insert_roll(con, 0, BOT_NAME, value, "bot")
+
+def set_guild_channel(con, guild_id: int, channel_id: int):
+    con.execute(
+        """INSERT INTO guild_channels (guild_id, channel_id, set_at)
+           VALUES (?, ?, ?)
+           ON CONFLICT(guild_id)
+           DO UPDATE SET channel_id=excluded.channel_id, set_at=excluded.set_at""",
+        (guild_id, channel_id, now_s())
+    )
+
+def onboarding_sent(con, guild_id: int):
+    row = con.execute(
+        "SELECT onboarding_sent FROM guild_meta WHERE guild_id=?",
+        (guild_id,)
+    ).fetchone()
+    return bool(row and row[0])
+
+def mark_onboarding_sent(con, guild_id: int):
+    con.execute(
+        "INSERT OR REPLACE INTO guild_meta (guild_id, onboarding_sent) VALUES (?, 1)",
+        (guild_id,)
+    )
+
 def setup_logging():
 
     if not ENABLE_COMMAND_LOGGING:
@@ -394,24 +730,18 @@ def log_error(message: str):
 def trim(name, max_len=20):
     return name[:max_len-1] + "…" if len(name) > max_len else name
     
-def get_user_stats(user_id: int):
-    with db() as con:
-        total = con.execute(
-            """
-            SELECT
-                COUNT(*) AS rolls,
-                SUM(value) AS score,
-                MAX(value) AS best,
-                AVG(value) AS avg
-            FROM rolls
-            WHERE user_id = ?
-              AND actor_type = 'user'
-            """,
-            (user_id,)
-        ).fetchone()
-
-        last10 = con.execute(
-            """
+_SQL_USER_STATS = """
+    WITH me AS (
+        SELECT score, rolls, best
+        FROM user_scores
+        WHERE user_id = ?
+    )
+    SELECT
+        (SELECT rolls FROM me) AS rolls,
+        (SELECT score FROM me) AS score,
+        (SELECT best FROM me) AS best,
+        (SELECT CAST(score AS REAL) / rolls FROM me) AS avg,
+        (
             SELECT AVG(value)
             FROM (
                 SELECT value
@@ -421,127 +751,569 @@ def get_user_stats(user_id: int):
                 ORDER BY rolled_at DESC
                 LIMIT 10
             )
-            """,
-            (user_id,)
-        ).fetchone()[0]
-
-        rank = con.execute(
-            """
+        ) AS avg10,
+        (
             SELECT COUNT(*) + 1
             FROM user_scores
-            WHERE score >
-            (
-                SELECT score
-                FROM user_scores
-                WHERE user_id = ?
-            )
-            """,
-            (user_id,)
-        ).fetchone()[0]
+            WHERE score > (SELECT score FROM me)
+        ) AS rank,
+        (
+            SELECT value
+            FROM rolls
+            WHERE user_id = ?
+              AND actor_type = 'user'
+              AND rolled_at BETWEEN ? AND ?
+            LIMIT 1
+        ) AS today
+"""
+
+def get_user_stats(con, user_id: int, start: int, end: int):
+    row = con.execute(
+        _SQL_USER_STATS,
+        (user_id, user_id, user_id, start, end)
+    ).fetchone()
 
     return {
-        "rolls": total[0] or 0,
-        "score": total[1] or 0,
-        "best": total[2] or 0,
-        "avg": float(total[3]) if total[3] else 0.0,
-        "avg10": float(last10) if last10 else 0.0,
-        "rank": rank
+        "rolls": row["rolls"] or 0,
+        "score": row["score"] or 0,
+        "best": row["best"] or 0,
+        "avg": float(row["avg"]) if row["avg"] else 0.0,
+        "avg10": float(row["avg10"]) if row["avg10"] else 0.0,
+        "rank": row["rank"],
+        "today": row["today"]
     }
 
-def calculate_streaks(user_id: int):
+# Local roll days as integers, julianday() truncated. idx_one_roll_per_day
+# already keeps one row per user and day, in day order
+_SQL_ROLL_DAYS = """
+    SELECT CAST(julianday(roll_date) AS INTEGER)
+    FROM rolls
+    WHERE user_id = ?
+      AND actor_type = 'user'
+      AND roll_date IS NOT NULL
+    ORDER BY roll_date
+"""
 
-    with db() as con:
-        rows = con.execute("""
-            SELECT DISTINCT roll_date
-            FROM rolls
-            WHERE user_id = ?
-              AND actor_type = 'user'
-            ORDER BY roll_date
-        """, (user_id,)).fetchall()
+# CAST(julianday(d) AS INTEGER) == d.toordinal() + this
+_JULIAN_ORDINAL_OFFSET = 1721424
 
-    if not rows:
-        return 0, 0
+def calculate_streaks(con, user_id: int):
 
-    dates = [datetime.fromisoformat(r[0]).date() for r in rows if r[0]]
+    days = [r[0] for r in con.execute(_SQL_ROLL_DAYS, (user_id,))]
 
-    best = 0
-    current_run = 0
-    prev_date = None
+    if not days:
+        return 0, 0
 
-    for d in dates:
+    best = 1
+    current_run = 1
 
-        if prev_date is None:
-            current_run = 1
+    for prev, day in zip(days, days[1:]):
 
-        elif d == prev_date + timedelta(days=1):
+        if day == prev + 1:
             current_run += 1
-
+            best = max(best, current_run)
         else:
             current_run = 1
 
-        best = max(best, current_run)
-        prev_date = d
+    # The run ending on the last roll is only current if that roll is today
+    today = datetime.now(TZ).toordinal() + _JULIAN_ORDINAL_OFFSET
+    current = current_run if days[-1] == today else 0
+
+    return current, best
+
+# Week and month in one pass over the span covering both. A week can
+# straddle two months, so neither window contains the other
+_SQL_PERIOD_STATS = """
+    WITH totals AS (
+        SELECT
+            user_id,
+            COUNT(CASE WHEN rolled_at BETWEEN :w0 AND :w1 THEN 1 END) AS w_rolls,
+            SUM(CASE WHEN rolled_at BETWEEN :w0 AND :w1 THEN value END) AS w_score,
+            MAX(CASE WHEN rolled_at BETWEEN :w0 AND :w1 THEN value END) AS w_best,
+            COUNT(CASE WHEN rolled_at BETWEEN :m0 AND :m1 THEN 1 END) AS m_rolls,
+            SUM(CASE WHEN rolled_at BETWEEN :m0 AND :m1 THEN value END) AS m_score,
+            MAX(CASE WHEN rolled_at BETWEEN :m0 AND :m1 THEN value END) AS m_best
+        FROM rolls
+        WHERE actor_type = 'user'
+          AND rolled_at BETWEEN MIN(:w0, :m0) AND MAX(:w1, :m1)
+        GROUP BY user_id
+    ),
+    me AS (
+        SELECT *
+        FROM totals
+        WHERE user_id = :user_id
+    )
+    SELECT
+        (SELECT w_rolls FROM me),
+        (SELECT w_score FROM me),
+        (SELECT w_best FROM me),
+        (
+            SELECT COUNT(*) + 1
+            FROM totals
+            WHERE w_score > (SELECT w_score FROM me)
+        ),
+        (SELECT m_rolls FROM me),
+        (SELECT m_score FROM me),
+        (SELECT m_best FROM me),
+        (
+            SELECT COUNT(*) + 1
+            FROM totals
+            WHERE m_score > (SELECT m_score FROM me)
+        )
+"""
+
+def get_period_stats(con, user_id: int, week: tuple[int, int], month: tuple[int, int]):
+    """
+    Rolls, score, best and rank for the week and month windows, as two
+    dicts. Ranks only count users ahead within the same window.
+    """
+    row = con.execute(_SQL_PERIOD_STATS, {
+        "user_id": user_id,
+        "w0": week[0],
+        "w1": week[1],
+        "m0": month[0],
+        "m1": month[1]
+    }).fetchone()
+
+    return tuple(
+        {
+            "rolls": row[i] or 0,
+            "score": row[i + 1] or 0,
+            "best": row[i + 2] or 0,
+            "rank": row[i + 3]
+        }
+        for i in (0, 4)
+    )
+
+_SQL_TODAY_RANK = """
+    SELECT rank
+    FROM (
+        SELECT user_id, RANK() OVER (ORDER BY MAX(value) DESC) AS rank
+        FROM rolls
+        WHERE actor_type = 'user'
+          AND rolled_at BETWEEN ? AND ?
+        GROUP BY user_id
+    )
+    WHERE user_id = ?
+"""
+
+def get_today_rank(con, user_id: int, start: int, end: int):
+    row = con.execute(_SQL_TODAY_RANK, (start, end, user_id)).fetchone()
+
+    return row[0] if row else None
+
+def get_user_summary(con, user_id: int):
+    # Totals come from user_scores, first and last roll are single
+    # probes at either end of idx_rolls_user_actor_time
+    return con.execute("""
+        SELECT
+            s.rolls,
+            s.best,
+            s.score,
+            (
+                SELECT MIN(rolled_at)
+                FROM rolls
+                WHERE user_id = s.user_id
+                  AND actor_type = 'user'
+            ),
+            (
+                SELECT MAX(rolled_at)
+                FROM rolls
+                WHERE user_id = s.user_id
+                  AND actor_type = 'user'
+            )
+        FROM user_scores s
+        WHERE s.user_id = ?
+    """, (user_id,)).fetchone()
+
+def get_export_stats(con):
+    # user_scores has one row per user who rolled, the bot count is an
+    # index range on actor_type
+    return con.execute("""
+        SELECT
+            COUNT(*),
+            COALESCE(SUM(rolls), 0),
+            (
+                SELECT COUNT(*)
+                FROM rolls
+                WHERE actor_type = 'bot'
+            )
+        FROM user_scores
+    """).fetchone()
+
+def get_usernames(con):
+    return con.execute("SELECT user_id, username FROM users").fetchall()
+
+def get_guild_channels(con):
+    return con.execute(
+        "SELECT guild_id, channel_id FROM guild_channels"
+    ).fetchall()
+
+def remove_guild(con, guild_id: int):
+    con.execute("DELETE FROM guild_channels WHERE guild_id = ?", (guild_id,))
+    con.execute("DELETE FROM guild_meta WHERE guild_id = ?", (guild_id,))
+
+def cleanup_stale_guilds(con, current_ids):
+    db_guilds = con.execute("""
+        SELECT guild_id FROM guild_channels
+        UNION
+        SELECT guild_id FROM guild_meta
+    """).fetchall()
+
+    cleaned = 0
+
+    for (gid,) in db_guilds:
+        if gid not in current_ids:
+            remove_guild(con, gid)
+            cleaned += 1
+
+    return cleaned
+
+# Consecutive days keep julianday - row number constant, so each
+# (user, grp) island is one unbroken run of daily rolls
+_SQL_LB_STREAK = """
+    WITH days AS (
+        SELECT DISTINCT user_id, roll_date
+        FROM rolls
+        WHERE actor_type = 'user' AND roll_date IS NOT NULL
+    ),
+    islands AS (
+        SELECT
+            user_id,
+            julianday(roll_date)
+                - ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY roll_date) AS grp
+        FROM days
+    ),
+    best AS (
+        SELECT user_id, MAX(run) AS best
+        FROM (
+            SELECT user_id, COUNT(*) AS run
+            FROM islands
+            GROUP BY user_id, grp
+        )
+        GROUP BY user_id
+        HAVING best >= 2
+    )
+    SELECT
+        COALESCE(
+            u.username,
+            (SELECT r.username FROM rolls r WHERE r.user_id = b.user_id LIMIT 1)
+        ),
+        b.best,
+        b.user_id,
+        COUNT(*) OVER ()
+    FROM best b
+    LEFT JOIN users u ON u.user_id = b.user_id
+    ORDER BY b.best DESC, b.user_id
+    LIMIT 10
+"""
+
+def get_streak_leaderboard(con):
+    ranked = con.execute(_SQL_LB_STREAK).fetchall()
+
+    rows = [r[:3] for r in ranked]
+
+    return rows, (ranked[0][3] if ranked else 0, None)
+
+# Top 10 and the footer numbers come back in one query
+_SQL_LB_ALLTIME = """
+    SELECT
+        COALESCE(u.username, 'Unknown'),
+        s.score,
+        s.user_id,
+        (SELECT COUNT(*) FROM user_scores),
+        (SELECT COALESCE(SUM(rolls), 0) FROM user_scores),
+        (
+            SELECT MIN(rolled_at)
+            FROM rolls
+            WHERE actor_type = 'user'
+        )
+    FROM user_scores s
+    LEFT JOIN users u ON u.user_id = s.user_id
+    ORDER BY s.score DESC
+    LIMIT 10
+"""
+
+def get_alltime_leaderboard(con):
+    ranked = con.execute(_SQL_LB_ALLTIME).fetchall()
+
+    rows = [r[:3] for r in ranked]
+    stats_row = ranked[0][3:] if ranked else (0, 0, None)
+
+    return rows, stats_row
+
+_SQL_LB_PERIOD = """
+    WITH agg AS (
+        SELECT user_id, SUM(score) AS score, SUM(rolls) AS rolls
+        FROM daily_scores
+        WHERE roll_date BETWEEN ? AND ?
+        GROUP BY user_id
+    )
+    SELECT
+        COALESCE(u.username, 'Unknown'),
+        a.score,
+        a.user_id,
+        COUNT(*) OVER (),
+        SUM(a.rolls) OVER ()
+    FROM agg a
+    LEFT JOIN users u ON u.user_id = a.user_id
+    ORDER BY a.score DESC
+    LIMIT 10
+"""
+
+def get_period_leaderboard(con, start_date, end_date):
+    ranked = con.execute(_SQL_LB_PERIOD, (start_date, end_date)).fetchall()
+
+    rows = [r[:3] for r in ranked]
+    stats_row = ranked[0][3:] if ranked else (0, 0)
+
+    return rows, stats_row
+
+def get_leaderboard(con, period_value, start_date, end_date):
+    if period_value == "streak":
+        return get_streak_leaderboard(con)
+
+    if period_value == "alltime":
+        return get_alltime_leaderboard(con)
+
+    return get_period_leaderboard(con, start_date, end_date)
 
-    today = datetime.now(TZ).date()
+def leaderboard_period(period_value, now):
+    """
+    Date window and title for a leaderboard period. Streak and all-time
+    have no window.
+    """
+    start_date = None
+    end_date = None
+
+    # =========================
+    # STREAK LEADERBOARD
+    # =========================
+    if period_value == "streak":
 
-    date_set = set(dates)
+        title_suffix = "Longest Streaks"
 
-    if today not in date_set:
-        current = 0
+    # =========================
+    # NORMAL PERIOD LEADERBOARDS
+    # =========================
     else:
-        current = 1
-        check_day = today
 
-        while True:
-            check_day -= timedelta(days=1)
+        if period_value == "today":
+            start = datetime(now.year, now.month, now.day, tzinfo=TZ)
+            end = start + timedelta(days=1)
+
+            start_date = start.date().isoformat()
+            end_date = end.date().isoformat()
+
+            title_suffix = f"Today — {now.strftime('%B %d')}"
+
+        elif period_value == "week":
+            start = now - timedelta(days=now.weekday())
+            start = datetime(start.year, start.month, start.day, tzinfo=TZ)
+            end = start + timedelta(days=7)
+
+            start_date = start.date().isoformat()
+            end_date = end.date().isoformat()
 
-            if check_day in date_set:
-                current += 1
+            title_suffix = f"Week {now.isocalendar().week}"
+
+        elif period_value == "month":
+            start = datetime(now.year, now.month, 1, tzinfo=TZ)
+
+            if now.month == 12:
+                end = datetime(now.year + 1, 1, 1, tzinfo=TZ)
             else:
-                break
+                end = datetime(now.year, now.month + 1, 1, tzinfo=TZ)
 
-    return current, best
+            start_date = start.date().isoformat()
+            end_date = end.date().isoformat()
 
-def get_period_stats(user_id: int, start_ts: int, end_ts: int):
-    with db() as con:
-        total = con.execute("""
-            SELECT COUNT(*), SUM(value), MAX(value)
-            FROM rolls
-            WHERE user_id = ?
-              AND actor_type = 'user'
-              AND rolled_at BETWEEN ? AND ?
-        """, (user_id, start_ts, end_ts)).fetchone()
+            title_suffix = now.strftime("%B")
 
-        rank = con.execute("""
-            SELECT COUNT(*) + 1
-            FROM (
-                SELECT user_id, SUM(value) AS score
-                FROM rolls
-                WHERE actor_type = 'user'
-                  AND rolled_at BETWEEN ? AND ?
-                GROUP BY user_id
-            )
-            WHERE score > (
-                SELECT SUM(value)
-                FROM rolls
-                WHERE user_id = ?
-                  AND actor_type = 'user'
-                  AND rolled_at BETWEEN ? AND ?
-            )
-        """, (start_ts, end_ts, user_id, start_ts, end_ts)).fetchone()[0]
+        elif period_value == "year":
+            start = datetime(now.year, 1, 1, tzinfo=TZ)
+            end = datetime(now.year + 1, 1, 1, tzinfo=TZ)
 
-    return {
-        "rolls": total[0] or 0,
-        "score": total[1] or 0,
-        "best": total[2] or 0,
-        "rank": rank
-    }
+            start_date = start.date().isoformat()
+            end_date = end.date().isoformat()
+
+            title_suffix = f"{now.year}"
+
+        elif period_value == "alltime":
+            title_suffix = "All Time"
+
+    return start_date, end_date, title_suffix
+
+LEADERBOARD_TTL = 30
+LEADERBOARD_CACHE = {}
+
+# Bumped on new rolls, entries built under an older generation are stale
+_leaderboard_gen = 0
+
+def invalidate_leaderboards():
+    """
+    Called on the event loop once a roll has committed. Running it there
+    keeps it from landing between cached_leaderboard's generation read
+    and its store, which a worker thread could do.
+    """
+    global _leaderboard_gen
+
+    _leaderboard_gen += 1
+
+async def cached_leaderboard(period_value, now, start_date, end_date, slack=0):
+    """
+    Leaderboards only change when someone rolls. An entry no roll has
+    touched is reused for the rest of its day, one a roll has made stale
+    is still served for up to LEADERBOARD_TTL seconds after it was built.
+    slack treats entries as that many seconds older, the refresher uses
+    it to rebuild stale ones before they would run out.
+
+    Entries are keyed on the day of the now the window was derived from,
+    so a window computed just before midnight is never stored as today's.
+    """
+    day = now.date()
+    cached = LEADERBOARD_CACHE.get(period_value)
+
+    if (
+        cached
+        and cached[0] == day
+        and (
+            cached[2] == _leaderboard_gen
+            or time.monotonic() - cached[1] + slack < LEADERBOARD_TTL
+        )
+    ):
+        return cached[3]
+
+    # Read before the query, a roll committing meanwhile leaves the
+    # result marked stale instead of passing for current
+    gen = _leaderboard_gen
+
+    result = await POOL.read(
+        get_leaderboard,
+        period_value,
+        start_date,
+        end_date
+    )
+
+    LEADERBOARD_CACHE[period_value] = (day, time.monotonic(), gen, result)
+
+    return result
+
+LEADERBOARD_PERIODS = ("today", "week", "month", "year", "alltime", "streak")
+
+# The refresher looks LEADERBOARD_TTL - LEADERBOARD_REFRESH ahead, so a
+# stale entry is rebuilt on the last pass before it would expire. The
+# gap leaves room for passes that run long
+LEADERBOARD_REFRESH = 10
+
+async def refresh_leaderboards():
+    """
+    Keeps LEADERBOARD_CACHE warm so /leaderboards rarely queries. Only
+    entries rolls have made stale, or from a past day, are rebuilt, and
+    each at most once per LEADERBOARD_TTL however many rolls come in.
+    """
+    while True:
+        now = datetime.now(TZ)
+
+        for period_value in LEADERBOARD_PERIODS:
+            start_date, end_date, _ = leaderboard_period(period_value, now)
+
+            try:
+                await cached_leaderboard(
+                    period_value,
+                    now,
+                    start_date,
+                    end_date,
+                    slack=LEADERBOARD_TTL - LEADERBOARD_REFRESH
+                )
+            except Exception:
+                log_error(f"LEADERBOARD REFRESH FAILED period={period_value}")
+
+        await asyncio.sleep(LEADERBOARD_REFRESH)
 
 def format_score(n: int) -> str:
     if n >= 1000:
         return f"{n / 1000:.1f}k"
     return str(n)
 
+FONT_PATH = "assets/fonts/JetBrainsMono-Regular.ttf"
+_FONTS = {}
+
+def load_font(size: int):
+    font = _FONTS.get(size)
+
+    if font is None:
+        font = ImageFont.truetype(FONT_PATH, size)
+        _FONTS[size] = font
+
+    return font
+
+LB_WIDTH = 640
+LB_HEIGHT = 820
+LB_HEADER_Y = 120
+LB_RANK_X = 20
+LB_USER_X = 95
+LB_SCORE_RIGHT = 620
+
+_TEMPLATES = {}
+
+def leaderboard_template(score_label):
+    """
+    Background, column headers and rule only depend on the score label,
+    so they are drawn once per label and each render starts from a copy.
+    """
+    template = _TEMPLATES.get(score_label)
+
+    if template is None:
+        template = Image.new(
+            "RGB",
+            (LB_WIDTH, LB_HEIGHT),
+            (35, 39, 42)
+        )
+
+        draw = ImageDraw.Draw(template)
+
+        body_font = load_font(30)
+
+        draw.text(
+            (LB_RANK_X, LB_HEADER_Y),
+            "#",
+            fill=(180, 180, 180),
+            font=body_font
+        )
+
+        draw.text(
+            (LB_USER_X, LB_HEADER_Y),
+            "USER",
+            fill=(180, 180, 180),
+            font=body_font
+        )
+
+        bbox = draw.textbbox(
+            (0, 0),
+            score_label,
+            font=body_font
+        )
+
+        label_width = bbox[2] - bbox[0]
+
+        draw.text(
+            (LB_SCORE_RIGHT - label_width, LB_HEADER_Y),
+            score_label,
+            fill=(180, 180, 180),
+            font=body_font
+        )
+
+        draw.line(
+            (20, LB_HEADER_Y + 35, 620, LB_HEADER_Y + 35),
+            fill=(90, 90, 90),
+            width=2
+        )
+
+        _TEMPLATES[score_label] = template
+
+    return template.copy()
+
 def render_leaderboard_png(
     title,
     rows,
@@ -551,37 +1323,16 @@ def render_leaderboard_png(
     score_label="SCORE"
 ):
 
-    import io
-
-    width = 640
-
     top_padding = 20
-    header_y = 120
     row_height = 48
 
-    height = 820
-
-    img = Image.new(
-        "RGB",
-        (width, height),
-        (35, 39, 42)
-    )
+    img = leaderboard_template(score_label)
 
     draw = ImageDraw.Draw(img)
 
-    title_font = ImageFont.truetype(
-        "assets/fonts/JetBrainsMono-Regular.ttf",
-        38
-    )
-
-    body_font = ImageFont.truetype(
-        "assets/fonts/JetBrainsMono-Regular.ttf",
-        30
-    )
+    title_font = load_font(38)
 
-    RANK_X = 20
-    USER_X = 95
-    SCORE_RIGHT = 620
+    body_font = load_font(30)
 
     draw.text(
         (20, top_padding),
@@ -590,42 +1341,7 @@ def render_leaderboard_png(
         font=title_font
     )
 
-    draw.text(
-        (RANK_X, header_y),
-        "#",
-        fill=(180, 180, 180),
-        font=body_font
-    )
-
-    draw.text(
-        (USER_X, header_y),
-        "USER",
-        fill=(180, 180, 180),
-        font=body_font
-    )
-
-    bbox = draw.textbbox(
-        (0, 0),
-        score_label,
-        font=body_font
-    )
-
-    label_width = bbox[2] - bbox[0]
-
-    draw.text(
-        (SCORE_RIGHT - label_width, header_y),
-        score_label,
-        fill=(180, 180, 180),
-        font=body_font
-    )
-
-    draw.line(
-        (20, header_y + 35, 620, header_y + 35),
-        fill=(90, 90, 90),
-        width=2
-    )
-
-    y = header_y + 50
+    y = LB_HEADER_Y + 50
 
     for pos, (username, score, uid) in enumerate(rows, start=1):
 
@@ -641,14 +1357,14 @@ def render_leaderboard_png(
             )
 
         draw.text(
-            (RANK_X, y),
+            (LB_RANK_X, y),
             str(pos),
             fill=(255, 255, 255),
             font=body_font
         )
 
         draw.text(
-            (USER_X, y),
+            (LB_USER_X, y),
             trim(username, 20),
             fill=(255, 255, 255),
             font=body_font
@@ -668,7 +1384,7 @@ def render_leaderboard_png(
         score_width = bbox[2] - bbox[0]
 
         draw.text(
-            (SCORE_RIGHT - score_width, y),
+            (LB_SCORE_RIGHT - score_width, y),
             score_text,
             fill=(255, 255, 255),
             font=body_font
@@ -676,10 +1392,7 @@ def render_leaderboard_png(
 
         y += row_height
 
-    stats_font = ImageFont.truetype(
-        "assets/fonts/JetBrainsMono-Regular.ttf",
-        26
-    )
+    stats_font = load_font(26)
 
     draw.text(
         (20, 710),
@@ -706,9 +1419,12 @@ def render_leaderboard_png(
 
     buffer = io.BytesIO()
 
+    # Flat colours compress well even at level 1, for a fraction of the
+    # default level's encode time
     img.save(
         buffer,
-        format="PNG"
+        format="PNG",
+        compress_level=1
     )
 
     buffer.seek(0)
@@ -725,18 +1441,17 @@ bot = commands.Bot(command_prefix="rollf_", intents=intents)
 @bot.event
 async def on_guild_join(guild: discord.Guild):
 
-    with db() as con:
-        row = con.execute(
-            "SELECT onboarding_sent FROM guild_meta WHERE guild_id=?",
-            (guild.id,)
-        ).fetchone()
-
-        if row and row[0]:
-            return
+    if await POOL.read(onboarding_sent, guild.id):
+        return
 
+    # The system channel is where most guilds expect bot posts, so it is
+    # tried before walking the channel list
+    me = guild.me
     channel = None
-    for ch in guild.text_channels:
-        perms = ch.permissions_for(guild.me)
+    for ch in (guild.system_channel, *guild.text_channels):
+        if ch is None:
+            continue
+        perms = ch.permissions_for(me)
         if perms.view_channel and perms.send_messages:
             channel = ch
             break
@@ -746,11 +1461,7 @@ async def on_guild_join(guild: discord.Guild):
 
     try:
         await channel.send(ONBOARDING_TEXT)
-        with db() as con:
-            con.execute(
-                "INSERT OR REPLACE INTO guild_meta (guild_id, onboarding_sent) VALUES (?, 1)",
-                (guild.id,)
-            )
+        await POOL.write(mark_onboarding_sent, guild.id)
     except discord.Forbidden:
         pass
 
@@ -758,12 +1469,22 @@ async def on_guild_join(guild: discord.Guild):
 
 @bot.event
 async def on_guild_remove(guild: discord.Guild):
-    with db() as con:
-        con.execute("DELETE FROM guild_channels WHERE guild_id = ?", (guild.id,))
-        con.execute("DELETE FROM guild_meta WHERE guild_id = ?", (guild.id,))
+    await POOL.write(remove_guild, guild.id)
+
+    channel_id = GUILD_CHANNELS.pop(guild.id, None)
+    if channel_id is not None:
+        CHANNEL_CACHE.pop(channel_id, None)
     
     await post_bot_stats()
 
+@bot.event
+async def on_guild_channel_delete(channel: discord.abc.GuildChannel):
+    CHANNEL_CACHE.pop(channel.id, None)
+
+    # Stop broadcasting to it, the stored row stays until /setchannel
+    if GUILD_CHANNELS.get(channel.guild.id) == channel.id:
+        del GUILD_CHANNELS[channel.guild.id]
+
 @bot.event
 async def on_ready():
 
@@ -772,10 +1493,9 @@ async def on_ready():
             f"BOT STARTED ({BOT_NAME})"
         )
 
-    global DAILY_ROLL_TASK
+    global DAILY_ROLL_TASK, LEADERBOARD_TASK
 
-    ensure_schema()
-    ensure_indexes()
+    await POOL.write(prepare_database)
     
     await post_botlist_commands()
     await post_bot_stats()
@@ -818,107 +1538,167 @@ async def on_ready():
     # -------- Cleanup stale guilds --------
     current_ids = {g.id for g in bot.guilds}
 
-    with db() as con:
-        db_guilds = con.execute("""
-            SELECT guild_id FROM guild_channels
-            UNION
-            SELECT guild_id FROM guild_meta
-        """).fetchall()
-
-        cleaned = 0
-
-        for (gid,) in db_guilds:
-            if gid not in current_ids:
-                con.execute("DELETE FROM guild_channels WHERE guild_id = ?", (gid,))
-                con.execute("DELETE FROM guild_meta WHERE guild_id = ?", (gid,))
-                cleaned += 1
+    cleaned = await POOL.write(cleanup_stale_guilds, current_ids)
 
     if cleaned > 0:
         print(f"Cleaned {cleaned} stale guild entries")
 
+    GUILD_CHANNELS.clear()
+    GUILD_CHANNELS.update(await POOL.read(get_guild_channels))
+
+    # Names already stored need no rewrite on the first roll after a restart
+    USERNAME_CACHE.update(await POOL.read(get_usernames))
+
+    # A fresh gateway session rebuilds discord.py's channel objects, so
+    # drop the old ones and pick up what is already in the client cache
+    CHANNEL_CACHE.clear()
+    for channel_id in GUILD_CHANNELS.values():
+        channel = bot.get_channel(channel_id)
+        if channel is not None:
+            CHANNEL_CACHE[channel_id] = channel
+
     # -------- Start daily roll task --------
     if DAILY_ROLL_TASK is None or DAILY_ROLL_TASK.done():
         DAILY_ROLL_TASK = asyncio.create_task(bot_daily_roll())
 
+    if LEADERBOARD_TASK is None or LEADERBOARD_TASK.done():
+        LEADERBOARD_TASK = asyncio.create_task(refresh_leaderboards())
+
     print(f"{BOT_NAME} online & ready.")
 
 # ---------------- DAILY BOT ROLL ----------------
 
-async def bot_daily_roll():
-    await bot.wait_until_ready()
+# guild_id -> channel_id, loaded in on_ready and kept in step by
+# /setchannel and guild removal
+GUILD_CHANNELS: dict[int, int] = {}
 
-    while not bot.is_closed():
-        now = datetime.now(TZ)
+CHANNEL_CACHE: dict[int, discord.abc.Messageable] = {}
 
-        if bot_rolled_today():
-            tomorrow = (now + timedelta(days=1)).replace(hour=5, minute=55, second=0, microsecond=0)
-            await asyncio.sleep((tomorrow - now).total_seconds())
-            continue
+# Sends in flight, not a rate. At typical round trips this can exceed
+# Discord's global limit, that is left to discord.py, which waits out
+# rate limit buckets and retries on 429
+BROADCAST_CONCURRENCY = 20
 
-        if now.hour >= 10:
-            tomorrow = (now + timedelta(days=1)).replace(hour=5, minute=55, second=0, microsecond=0)
-            await asyncio.sleep((tomorrow - now).total_seconds())
-            continue
+OWNER_NOTICE_NO_ACCESS = (
+    "RollF could not access the configured channel on **{guild}**.\n"
+    "Reason: missing permissions or role conflicts.\n"
+    "Fix: give RollF explicit permissions in the selected channel "
+    "(View Channel, Send Messages, Embed Links) and check category denies."
+)
 
-        if now.hour < 6:
-            target = now.replace(hour=6, minute=0, second=0, microsecond=0)
-            await asyncio.sleep((target - now).total_seconds())
+OWNER_NOTICE_SEND_FAILED = (
+    "RollF failed to send its daily roll in **{guild}**.\n"
+    "Please check channel permissions."
+)
 
-        delay = secrets.randbelow(4 * 60 * 60)
-        await asyncio.sleep(delay)
+async def send_daily_roll(
+    guild_id: int,
+    channel_id: int,
+    value: int,
+    sem: asyncio.Semaphore,
+    notices: list
+):
+    async with sem:
 
-        if bot_rolled_today():
-            continue
+        channel = CHANNEL_CACHE.get(channel_id) or bot.get_channel(channel_id)
+        if channel is None:
+            try:
+                channel = await bot.fetch_channel(channel_id)
+            except discord.NotFound:
+                # Gone for good, skip the lookup on later days
+                if GUILD_CHANNELS.get(guild_id) == channel_id:
+                    del GUILD_CHANNELS[guild_id]
+                return
+            except discord.Forbidden:
+                notices.append((guild_id, OWNER_NOTICE_NO_ACCESS))
+                return
+            except discord.HTTPException:
+                return
+
+        CHANNEL_CACHE[channel_id] = channel
+
+        try:
+            await channel.send(f"{BOT_NAME} rolled **{value}** 🎲")
+        except discord.Forbidden:
+            notices.append((guild_id, OWNER_NOTICE_SEND_FAILED))
+        except discord.HTTPException:
+            log_error(f"DAILY ROLL SEND FAILED guild={guild_id} channel={channel_id}")
+
+async def notify_guild_owner(guild_id: int, notice: str, sem: asyncio.Semaphore):
+    async with sem:
+        try:
+            guild = bot.get_guild(guild_id)
+            if guild and guild.owner:
+                await guild.owner.send(notice.format(guild=guild.name))
+        except Exception:
+            pass
+
+def next_bot_roll_time(now: datetime, rolled_today: bool) -> datetime:
+    """
+    The bot rolls at a random moment within four hours of 06:00, or of
+    now if today's window is already open. Past 10:00 or once today's
+    roll exists, the next window is tomorrow's.
+    """
+    if rolled_today or now.hour >= 10:
+        tomorrow = now + timedelta(days=1)
+        window_start = tomorrow.replace(hour=6, minute=0, second=0, microsecond=0)
+    elif now.hour < 6:
+        window_start = now.replace(hour=6, minute=0, second=0, microsecond=0)
+    else:
+        window_start = now
+
+    delay = _RNG.randrange(4 * 60 * 60)
+    return window_start + timedelta(seconds=delay)
+
+# asyncio wakes on the monotonic clock and may fire up to one tick early,
+# which would land a roll scheduled for 06:00:00 in the previous second
+_CLOCK_EPSILON = time.get_clock_info("monotonic").resolution
+
+async def bot_daily_roll():
+    await bot.wait_until_ready()
+
+    while not bot.is_closed():
+        now = datetime.now(TZ)
+        fire_at = next_bot_roll_time(now, await POOL.read(bot_rolled_today))
 
-        value = secrets.randbelow(100) + 1
-        insert_roll(0, BOT_NAME, value, "bot")
+        # Same-zone datetime subtraction is wall-clock time and would be an
+        # hour off across a DST change, so measure the wait in epoch time
+        await asyncio.sleep(
+            max(0, fire_at.timestamp() - time.time()) + _CLOCK_EPSILON
+        )
 
+        value = _RNG.randint(1, 100)
+        await POOL.write(record_bot_roll, value)
 
         log_event(
             f"BOT ROLL value={value}"
         )
 
-        with db() as con:
-            rows = con.execute(
-                "SELECT guild_id, channel_id FROM guild_channels"
-            ).fetchall()
-
-        for guild_id, channel_id in rows:
-
-            channel = bot.get_channel(channel_id)
-            if channel is None:
-                try:
-                    channel = await bot.fetch_channel(channel_id)
-                except discord.NotFound:
-                    continue
-                except discord.Forbidden:
-                    try:
-                        guild = bot.get_guild(guild_id)
-                        if guild and guild.owner:
-                            await guild.owner.send(
-                                f"RollF could not access the configured channel on **{guild.name}**.\n"
-                                f"Reason: missing permissions or role conflicts.\n"
-                                f"Fix: give RollF explicit permissions in the selected channel "
-                                f"(View Channel, Send Messages, Embed Links) and check category denies."
-                            )
-                    except Exception:
-                        pass
-                    continue
-                except discord.HTTPException:
-                    continue
+        rows = list(GUILD_CHANNELS.items())
 
-            try:
-                await channel.send(f"{BOT_NAME} rolled **{value}** 🎲")
-            except discord.Forbidden:
-                try:
-                    guild = bot.get_guild(guild_id)
-                    if guild and guild.owner:
-                        await guild.owner.send(
-                            f"RollF failed to send its daily roll in **{guild.name}**.\n"
-                            f"Please check channel permissions."
-                        )
-                except Exception:
-                    pass
+        # Caps sends in flight; owner DMs wait until every channel post is out
+        sem = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        notices = []
+
+        await asyncio.gather(
+            *(
+                send_daily_roll(guild_id, channel_id, value, sem, notices)
+                for guild_id, channel_id in rows
+            ),
+            return_exceptions=True
+        )
+
+        await asyncio.gather(
+            *(notify_guild_owner(guild_id, notice, sem) for guild_id, notice in notices),
+            return_exceptions=True
+        )
+
+        # Once a day, after the posts so neither a slow ANALYZE nor a
+        # failing one holds them up or ends the task
+        try:
+            await POOL.write(optimize_db)
+        except Exception:
+            log_error("DAILY OPTIMIZE FAILED")
 
 # ---------------- COMMANDS ----------------
 
@@ -933,54 +1713,18 @@ async def stats(
     log_command(interaction, "/stats")
 
     target = user or interaction.user
-    stats = get_user_stats(target.id)
     start, end = today_range()
+    stats = await POOL.read(get_user_stats, target.id, start, end)
 
-    week_start = now = datetime.now(TZ)
-    week_start = week_start - timedelta(days=week_start.weekday())
-    week_start = datetime(week_start.year, week_start.month, week_start.day, tzinfo=TZ)
-    week_end = week_start + timedelta(days=7)
-
-    month_start = datetime(now.year, now.month, 1, tzinfo=TZ)
-    if now.month == 12:
-        month_end = datetime(now.year + 1, 1, 1, tzinfo=TZ)
-    else:
-        month_end = datetime(now.year, now.month + 1, 1, tzinfo=TZ)
-
-    week_stats = get_period_stats(target.id, int(week_start.timestamp()), int(week_end.timestamp()))
-    month_stats = get_period_stats(target.id, int(month_start.timestamp()), int(month_end.timestamp()))
-    current_streak, best_streak = calculate_streaks(target.id)
-
-    with db() as con:
-        today_row = con.execute(
-            """
-            SELECT value
-            FROM rolls
-            WHERE user_id = ?
-              AND actor_type = 'user'
-              AND rolled_at BETWEEN ? AND ?
-            LIMIT 1
-            """,
-            (target.id, start, end)
-        ).fetchone()
+    week, month = period_windows()
+    week_stats, month_stats = await POOL.read(get_period_stats, target.id, week, month)
+    current_streak, best_streak = await POOL.read(calculate_streaks, target.id)
 
+    today_roll = stats["today"]
     today_rank = None
 
-    if today_row:
-        with db() as con:
-            ranking_today = con.execute("""
-                SELECT user_id, MAX(value) AS score
-                FROM rolls
-                WHERE actor_type = 'user'
-                  AND rolled_at BETWEEN ? AND ?
-                GROUP BY user_id
-                ORDER BY score DESC
-            """, (start, end)).fetchall()
-
-        for index, (uid, _) in enumerate(ranking_today, start=1):
-            if uid == target.id:
-                today_rank = index
-                break
+    if today_roll is not None:
+        today_rank = await POOL.read(get_today_rank, target.id, start, end)
 
     if stats["rolls"] == 0:
         await interaction.response.send_message(
@@ -997,11 +1741,11 @@ async def stats(
     embed.set_thumbnail(url=target.display_avatar.url)
 
     # Row 1
-    if today_row:
+    if today_roll is not None:
         today_value = (
-            f"Roll: {today_row[0]}\n"
+            f"Roll: {today_roll}\n"
             f"Rank: #{today_rank}" if today_rank else
-            f"Roll: {today_row[0]}"
+            f"Roll: {today_roll}"
         )
     else:
         today_value = "No roll yet."
@@ -1109,27 +1853,28 @@ async def roll(interaction: discord.Interaction):
 
     log_command(interaction, "/roll")
 
-    start, end = today_range()
+    value = _RNG.randint(1, 100)
 
-    with db() as con:
-        row = con.execute(
-            """
-            SELECT value
-            FROM rolls
-            WHERE user_id = ?
-              AND actor_type = 'user'
-              AND rolled_at BETWEEN ? AND ?
-            LIMIT 1
-            """,
-            (interaction.user.id, start, end)
-        ).fetchone()
+    # idx_one_roll_per_day rejects a second roll, so the insert doubles
+    # as the "already rolled" check
+    success = await POOL.write(record_roll, interaction.user.id, interaction.user.name, value)
+
+    if success:
+        invalidate_leaderboards()
+    else:
+        row = await POOL.read(get_today_roll, interaction.user.id, today_date())
+
+        if row is None:
+            await interaction.response.send_message(
+                "You already rolled today.",
+                ephemeral=True
+            )
+            return
 
-    if row:
         value = row[0]
 
-        now = datetime.now(TZ)
-        midnight = datetime(now.year, now.month, now.day, tzinfo=TZ) + timedelta(days=1)
-        remaining = max(0, int((midnight - now).total_seconds()))
+        _, end = today_range()
+        remaining = max(0, end - now_s())
 
         if remaining < 3600:
             # under 1h → ceil minutes
@@ -1156,8 +1901,6 @@ async def roll(interaction: discord.Interaction):
         )
         return
 
-    value = secrets.randbelow(100) + 1
-
     now = datetime.now(TZ)
 
     april_fools = (
@@ -1166,22 +1909,12 @@ async def roll(interaction: discord.Interaction):
     )
 
     if april_fools:
-        steps = 10 + secrets.randbelow(11)
+        steps = random.randint(10, 20)
         print("--- APRIL FOOLS ACTIVE ---")
     else:
-        steps = secrets.randbelow(6)
+        steps = random.randrange(4)
 
     if steps == 0:
-        upsert_user(interaction.user.id, interaction.user.name)
-        success = insert_roll(interaction.user.id, interaction.user.name, value, "user")
-
-        if not success:
-            await interaction.response.send_message(
-                "You already rolled today.",
-                ephemeral=True
-            )
-            return
-
         await interaction.response.send_message(
             f"{interaction.user.mention} rolled **{value}** 🎲"
         )
@@ -1192,15 +1925,18 @@ async def roll(interaction: discord.Interaction):
     )
     msg = await interaction.original_response()
 
-    for _ in range(steps):
-
-        if april_fools:                                             # April Fools' Day event
-            fake = secrets.randbelow(900_000_000) + 100_000_000     # Displays fake massive roll values on April 1st.
-        else:                                                       # Real values are still stored in the database.
-            fake = secrets.randbelow(100) + 1
+    if april_fools:                                                 # April Fools' Day event
+        fakes = [                                                   # Displays fake massive roll values on April 1st.
+            random.randrange(100_000_000, 1_000_000_000)            # Real values are still stored in the database.
+            for _ in range(steps)
+        ]
+    else:
+        fakes = random.sample(
+            [n for n in range(1, 101) if n != value],
+            k=steps
+        )
 
-            while fake == value:
-                fake = secrets.randbelow(100) + 1
+    for fake in fakes:
 
         await msg.edit(
             content=f"{interaction.user.mention} rolling {fake:,}"
@@ -1211,16 +1947,7 @@ async def roll(interaction: discord.Interaction):
         else:
             await asyncio.sleep(0.5)
 
-    upsert_user(interaction.user.id, interaction.user.name)
-    success = insert_roll(interaction.user.id, interaction.user.name, value, "user")
-
-    if not success:
-        await msg.edit(
-            content=f"{interaction.user.mention}\nYou already rolled today."
-        )
-        return
-
-    current_streak, _ = calculate_streaks(interaction.user.id)
+    current_streak, _ = await POOL.read(calculate_streaks, interaction.user.id)
     milestones = {10, 25, 50, 100, 250, 500, 1000}
 
     display_value = value
@@ -1228,7 +1955,7 @@ async def roll(interaction: discord.Interaction):
     if april_fools:
         display_value = (
             value * 10_000_000
-            + secrets.randbelow(90_000_000)
+            + random.randrange(90_000_000)
         )
 
     if current_streak in milestones:
@@ -1271,185 +1998,17 @@ async def leaderboards(
 
     now = datetime.now(TZ)
 
-    rows = []
-    ranking = []
-    stats_row = (0, 0)
-
-    # =========================
-    # STREAK LEADERBOARD
-    # =========================
-    if period_value == "streak":
+    start_date, end_date, title_suffix = leaderboard_period(period_value, now)
 
-        with db() as con:
-            all_dates = con.execute("""
-                SELECT r.user_id, r.roll_date, COALESCE(u.username, r.username) as username
-                FROM rolls r
-                LEFT JOIN users u ON u.user_id = r.user_id
-                WHERE r.actor_type = 'user' AND r.roll_date IS NOT NULL
-                GROUP BY r.user_id, r.roll_date
-                ORDER BY r.user_id, r.roll_date
-            """).fetchall()
-
-        user_dates = {}
-        user_names = {}
-
-        for uid, roll_date, username in all_dates:
-            if uid not in user_dates:
-                user_dates[uid] = set()
-                user_names[uid] = username
-            user_dates[uid].add(roll_date)
-
-        # Beräkna best streak per användare
-        streak_data = []
-
-        for uid, date_set in user_dates.items():
-            dates = sorted(datetime.fromisoformat(d).date() for d in date_set)
-            best = 1
-            current_run = 1
-
-            for i in range(1, len(dates)):
-                if dates[i] == dates[i - 1] + timedelta(days=1):
-                    current_run += 1
-                    best = max(best, current_run)
-                else:
-                    current_run = 1
-
-            if best >= 2:
-                streak_data.append((uid, best, user_names[uid]))
-
-        streak_data.sort(key=lambda x: x[1], reverse=True)
-
-        for uid, best, username in streak_data:
-            rows.append((username, best, uid))
-            ranking.append((uid, best))
-
-        rows = rows[:10]
-
-        title_suffix = "Longest Streaks"
-        stats_row = (len(streak_data), None)
-
-    # =========================
-    # NORMAL PERIOD LEADERBOARDS
-    # =========================
-    else:
-
-        start_ts = None
-        end_ts = None
-
-        if period_value == "today":
-            start = datetime(now.year, now.month, now.day, tzinfo=TZ)
-            end = start + timedelta(days=1)
-
-            start_ts = int(start.timestamp())
-            end_ts = int(end.timestamp())
-
-            start_date = start.date().isoformat()
-            end_date = end.date().isoformat()
-
-            title_suffix = f"Today — {now.strftime('%B %d')}"
-
-        elif period_value == "week":
-            start = now - timedelta(days=now.weekday())
-            start = datetime(start.year, start.month, start.day, tzinfo=TZ)
-            end = start + timedelta(days=7)
-
-            start_ts = int(start.timestamp())
-            end_ts = int(end.timestamp())
-
-            start_date = start.date().isoformat()
-            end_date = end.date().isoformat()
-
-            title_suffix = f"Week {now.isocalendar().week}"
-
-        elif period_value == "month":
-            start = datetime(now.year, now.month, 1, tzinfo=TZ)
-
-            if now.month == 12:
-                end = datetime(now.year + 1, 1, 1, tzinfo=TZ)
-            else:
-                end = datetime(now.year, now.month + 1, 1, tzinfo=TZ)
-
-            start_ts = int(start.timestamp())
-            end_ts = int(end.timestamp())
-
-            start_date = start.date().isoformat()
-            end_date = end.date().isoformat()
-
-            title_suffix = now.strftime("%B")
-
-        elif period_value == "year":
-            start = datetime(now.year, 1, 1, tzinfo=TZ)
-            end = datetime(now.year + 1, 1, 1, tzinfo=TZ)
-
-            start_ts = int(start.timestamp())
-            end_ts = int(end.timestamp())
-
-            start_date = start.date().isoformat()
-            end_date = end.date().isoformat()
-
-            title_suffix = f"{now.year}"
-
-        elif period_value == "alltime":
-            title_suffix = "All Time"
-
-        with db() as con:
-
-            if period_value == "alltime":
-
-                rows = con.execute("""
-                    SELECT
-                        COALESCE(u.username, 'Unknown'),
-                        s.score,
-                        s.user_id
-                    FROM user_scores s
-                    LEFT JOIN users u ON u.user_id = s.user_id
-                    ORDER BY s.score DESC
-                    LIMIT 10
-                """).fetchall()
-
-                ranking = con.execute("""
-                    SELECT user_id, score
-                    FROM user_scores
-                    ORDER BY score DESC
-                    LIMIT 100
-                """).fetchall()
-
-                stats_row = con.execute("""
-                    SELECT COUNT(DISTINCT user_id), COUNT(*)
-                    FROM rolls
-                    WHERE actor_type = 'user'
-                """).fetchone()
-
-            else:
+    rows, stats_row = await cached_leaderboard(
+        period_value,
+        now,
+        start_date,
+        end_date
+    )
 
-                rows = con.execute("""
-                    SELECT COALESCE(u.username, 'Unknown'), SUM(d.score), d.user_id
-                    FROM daily_scores d
-                    LEFT JOIN users u ON u.user_id = d.user_id
-                    WHERE d.roll_date BETWEEN ? AND ?
-                    GROUP BY d.user_id
-                    ORDER BY SUM(d.score) DESC
-                    LIMIT 10
-                """, (start_date, end_date)).fetchall()
-
-                ranking = con.execute("""
-                    SELECT d.user_id,
-                           COALESCE(u.username, 'Unknown') AS username,
-                           SUM(d.score) AS score
-                    FROM daily_scores d
-                    LEFT JOIN users u ON u.user_id = d.user_id
-                    WHERE d.roll_date BETWEEN ? AND ?
-                    GROUP BY d.user_id
-                    ORDER BY score DESC
-                    LIMIT 100
-                """, (start_date, end_date)).fetchall()
-
-                stats_row = con.execute("""
-                    SELECT COUNT(DISTINCT user_id), COUNT(*)
-                    FROM rolls
-                    WHERE rolled_at BETWEEN ? AND ?
-                      AND actor_type = 'user'
-                """, (start_ts, end_ts)).fetchone()
+    # Cached rows are shared, pad a copy
+    rows = list(rows)
 
     # =========================
     # RENDER (COMMON)
@@ -1505,12 +2064,7 @@ async def leaderboards(
 
     elif period_value == "alltime":
 
-        with db() as con:
-            first_roll = con.execute("""
-                SELECT MIN(rolled_at)
-                FROM rolls
-                WHERE actor_type = 'user'
-                """).fetchone()[0]
+        first_roll = stats_row[2]
 
         if first_roll:
             started = datetime.fromtimestamp(first_roll, TZ)
@@ -1552,14 +2106,8 @@ async def setchannel(interaction: discord.Interaction, channel: discord.TextChan
 
     log_command(interaction, "/setchannel")
 
-    with db() as con:
-        con.execute(
-            """INSERT INTO guild_channels (guild_id, channel_id, set_at)
-               VALUES (?, ?, ?)
-               ON CONFLICT(guild_id)
-               DO UPDATE SET channel_id=excluded.channel_id, set_at=excluded.set_at""",
-            (interaction.guild.id, channel.id, int(time.time()))
-        )
+    await POOL.write(set_guild_channel, interaction.guild.id, channel.id)
+    GUILD_CHANNELS[interaction.guild.id] = channel.id
 
     await interaction.response.send_message(
         f"Daily rolls will be posted in {channel.mention}",
@@ -1602,18 +2150,7 @@ if ADMIN_MODE:
         # ========================
         # GLOBAL BOT STATS
         # ========================
-        with db() as con:
-            total_users, total_rolls = con.execute("""
-                SELECT COUNT(DISTINCT user_id), COUNT(*)
-                FROM rolls
-                WHERE actor_type = 'user'
-            """).fetchone()
-
-            total_bot_rolls = con.execute("""
-                SELECT COUNT(*)
-                FROM rolls
-                WHERE actor_type = 'bot'
-            """).fetchone()[0]
+        total_users, total_rolls, total_bot_rolls = await POOL.read(get_export_stats)
 
         stats_buffer = io.StringIO()
         stats_writer = csv.writer(stats_buffer)
@@ -1679,33 +2216,23 @@ if ADMIN_MODE:
         except Exception:
             username = f"Unknown ({uid})"
 
-        with db() as con:
-
-            rolls = con.execute("""
-                SELECT value, rolled_at
-                FROM rolls
-                WHERE user_id = ?
-                  AND actor_type = 'user'
-                ORDER BY rolled_at
-            """, (uid,)).fetchall()
+        summary = await POOL.read(get_user_summary, uid)
 
-        if not rolls:
+        if not summary:
             await interaction.response.send_message(
                 "User has no rolls.",
                 ephemeral=True
             )
             return
 
-        values = [r[0] for r in rolls]
+        total_rolls, best_roll, score, first_at, last_at = summary
 
-        total_rolls = len(values)
-        best_roll = max(values)
-        avg_roll = round(sum(values) / total_rolls, 2)
+        avg_roll = round(score / total_rolls, 2)
 
-        current, best = calculate_streaks(uid)
+        current, best = await POOL.read(calculate_streaks, uid)
 
-        first_roll = datetime.fromtimestamp(rolls[0][1], TZ).strftime("%Y-%m-%d")
-        last_roll = datetime.fromtimestamp(rolls[-1][1], TZ).strftime("%Y-%m-%d")
+        first_roll = datetime.fromtimestamp(first_at, TZ).strftime("%Y-%m-%d")
+        last_roll = datetime.fromtimestamp(last_at, TZ).strftime("%Y-%m-%d")
 
         await interaction.response.send_message(
             f"User: {username}\n"